@@ -1,143 +1,773 @@
 import streamlit as st
 import requests
-import re
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from urllib3.util.retry import Retry
+import time
+import base64
+import hashlib
+import http.cookiejar
+import sqlite3
 import logging
-from openai import OpenAI
-from pinecone import Pinecone
-from functools import lru_cache
-from typing import List, Dict, Any
-
-# Configure logging
-logging.basicConfig(
-    filename="app.log",
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s"
-)
+import logging.handlers
+import queue
+import atexit
+import threading
+import uuid
+import unicodedata
+import numpy as np
+import orjson
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any
+
+# openai and pinecone are slow to import, so they are only imported by the client
+# factories below, the first time a page needs embeddings or similarity checks
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from pinecone.grpc import PineconeGRPC
+
+# Configure logging. Records go through a queue and are written to app.log by a
+# background listener thread, so logging never blocks the script on file I/O.
+# The listener buffers records and writes them in batches, flushing
+# immediately on errors.
+LOG_BUFFER_CAPACITY = 256
+LOG_QUEUE_HANDLER_NAME = "app_log_queue"
+
+@st.cache_resource(show_spinner=False)
+def get_log_listener():
+    root_logger = logging.getLogger()
+    # A cleared cache re-runs this function; reuse the installed handler's listener
+    # instead of adding a second handler and thread that would duplicate every line
+    for handler in root_logger.handlers:
+        if handler.get_name() == LOG_QUEUE_HANDLER_NAME:
+            return handler.listener
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler("app.log")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    buffer_handler = logging.handlers.MemoryHandler(
+        capacity=LOG_BUFFER_CAPACITY,
+        flushLevel=logging.ERROR,
+        target=file_handler
+    )
+    listener = logging.handlers.QueueListener(log_queue, buffer_handler)
+    listener.start()
+    # Stop the listener first so every queued record reaches the buffer, then flush it
+    atexit.register(buffer_handler.close)
+    atexit.register(listener.stop)
+    # INFO by default; production can raise it, e.g. to WARNING, with the LOG_LEVEL secret
+    log_level = str(st.secrets.get("LOG_LEVEL", "INFO")).upper()
+    valid_level = isinstance(logging.getLevelName(log_level), int)
+    root_logger.setLevel(log_level if valid_level else logging.INFO)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.set_name(LOG_QUEUE_HANDLER_NAME)
+    queue_handler.listener = listener
+    root_logger.addHandler(queue_handler)
+    if not valid_level:
+        logging.warning(f"Invalid LOG_LEVEL secret {log_level!r}; using INFO")
+    return listener
+
+get_log_listener()
 
 # Configure logging
 #logging.basicConfig(level=logging.DEBUG)
 
-# Load API keys from Streamlit secrets
+# Load API keys from Streamlit secrets once per server process
+@st.cache_resource(show_spinner=False)
+def get_api_keys():
+    return {
+        "openai": st.secrets["OPENAI_API_KEY"],
+        "pinecone": st.secrets["PINECONE_API_KEY"]
+    }
+
 try:
-    openai_api_key = st.secrets["OPENAI_API_KEY"]
-    pinecone_api_key = st.secrets["PINECONE_API_KEY"]
+    get_api_keys()
 except KeyError as e:
     st.error(f"API key is missing: {e}. Please configure it in the Streamlit app settings under Secrets.")
     logging.error(f"Missing API key: {e}")
     st.stop()
 
-# Hard-coded index name
-index_name = "title-index"
+# Non-secret settings, resolved from st.secrets once per process instead of on every rerun
+@st.cache_resource(show_spinner=False)
+def get_settings():
+    return {
+        "app_debug": str(st.secrets.get("APP_DEBUG", False)).lower() in ("1", "true", "yes"),
+        "index_name": st.secrets.get("PINECONE_INDEX_NAME", "title-index"),
+        "embedding_dimensions": int(st.secrets["EMBEDDING_DIMENSIONS"]) if "EMBEDDING_DIMENSIONS" in st.secrets else None,
+        "api_base_url": st.secrets["API_BASE_URL"],
+        "base_url": st.secrets["BASE_URL"]
+    }
 
-# API base URL
-api_base_url = st.secrets["API_BASE_URL"]
-base_url = st.secrets["BASE_URL"]
+settings = get_settings()
 
-# Initialize Pinecone
-try:
-    logging.info("Initializing Pinecone...")
-    pc = Pinecone(api_key=pinecone_api_key)
-
-    # List all indexes
-    logging.info("Listing Pinecone indexes...")
-    all_indexes = pc.list_indexes()
-    logging.info(f"Raw Pinecone response: {all_indexes}")
-
-    # Debug: Log the type of all_indexes
-    logging.info(f"Type of all_indexes: {type(all_indexes)}")
-
-    # Handle the IndexList object properly
-    index_names = []
-    if isinstance(all_indexes, list):
-        index_names = all_indexes
-    elif hasattr(all_indexes, 'indexes'):
-        # Access the 'indexes' property directly if it exists
-        index_names = [index.name for index in all_indexes.indexes]
-    else:
-        st.warning(f"Unexpected format of the index list: {all_indexes}")
+# Enables extra diagnostics, such as Pinecone index stats on startup
+APP_DEBUG = settings["app_debug"]
 
-    logging.info(f"Extracted index names: {index_names}")
+# Pinecone index name; a reduced-dimension index can be configured in secrets
+index_name = settings["index_name"]
 
-    # Check for the specific index
-    if index_name not in index_names:
-        st.warning(f"Index '{index_name}' not found in Pinecone. Available indexes are: {index_names}")
-    else:
-        index = pc.Index(index_name)
-        logging.info(f"Successfully connected to Pinecone index: {index_name}")
+# Embedding model and optional truncated output size. text-embedding-3 models
+# support native truncation, e.g. 256 dimensions for 6x smaller vectors; the
+# configured index must have been created with the same dimension.
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = settings["embedding_dimensions"]
+
+# API base URL
+api_base_url = settings["api_base_url"]
+base_url = settings["base_url"]
+
+# Backend endpoints, built once instead of on every call
+LOGIN_URL = f"{api_base_url}/user/login"
+QUIZ_CREATE_URL = f"{api_base_url}/quiz/create"
+QUIZ_LIST_URL = f"{api_base_url}/quiz/list"
+QUIZ_DETAIL_URL = f"{api_base_url}/quiz/{{quiz_id}}"
+PUZZLE_UPLOAD_URL = f"{api_base_url}/admin/quiz/puzzle/upload"
+ESTHETICIAN_APPROVAL_LIST_URL = f"{api_base_url}/admin/esthetician/approval_list"
+APPROVE_ESTHETICIAN_URL = f"{api_base_url}/admin/approve_esthetician/{{esthetician_id}}"
+ANALYZE_SKIN_URL = f"{api_base_url}/ai/analyze_skin"
+QUIZ_RECOMMENDATION_URL = f"{api_base_url}/ai/diary_quiz_recommendation"
+START_QUIZ_URL = f"{api_base_url}/quiz/start_quiz"
+FETCH_NEXT_QUESTION_URL = f"{api_base_url}/quiz/fetch_next"
+SUBMIT_QUIZ_URL = f"{api_base_url}/quiz/submit"
+
+# Shared HTTP session so backend calls reuse pooled keep-alive connections.
+# The session is shared by every user, so it must not keep cookies either.
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            backoff_jitter=0.25,
+            status_forcelist=[429, 502, 503, 504],
+            respect_retry_after_header=True
+        )
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+SESSION = get_http_session()
+
+# (connect, read) timeouts in seconds for backend calls, so a stalled backend
+# cannot hang the script run. Uploads get a longer read timeout.
+HTTP_TIMEOUT = (3, 10)
+HTTP_UPLOAD_TIMEOUT = (3, 60)
+# Skin analysis, recommendations and quiz progress are model-backed and can take a
+# while to answer, so they get a longer read timeout
+HTTP_AI_TIMEOUT = (3, 30)
+
+# Pinecone gRPC client, shared so its channel lives for the server process.
+# gRPC multiplexes queries over one HTTP/2 connection instead of REST round-trips.
+@st.cache_resource(show_spinner=False)
+def get_pinecone_client() -> "PineconeGRPC":
+    from pinecone.grpc import PineconeGRPC
+
+    logging.info("Initializing Pinecone...")
+    return PineconeGRPC(api_key=get_api_keys()["pinecone"])
+
+# Pinecone index handle, created once per server process instead of on every rerun
+@st.cache_resource(show_spinner=False)
+def get_pinecone_index():
+    pc = get_pinecone_client()
+    # The index name is known, so connect directly instead of listing all indexes first
+    index = pc.Index(index_name)
+    logging.info(f"Successfully connected to Pinecone index: {index_name}")
+    # Index stats are diagnostics only and cost an extra round-trip, so skip them unless debugging
+    if APP_DEBUG:
         index_description = index.describe_index_stats()
         logging.info(f"Index dimensions: {index_description['dimension']}")
         logging.info(f"Total vectors: {index_description['total_vector_count']}")
+        if EMBEDDING_DIMENSIONS and index_description['dimension'] != EMBEDDING_DIMENSIONS:
+            st.warning(f"Index '{index_name}' has dimension {index_description['dimension']}, but embeddings are configured for {EMBEDDING_DIMENSIONS}.")
+    return index
+
+# OpenAI client, created once per server process instead of on every rerun
+@st.cache_resource(show_spinner=False)
+def get_openai_client() -> "OpenAI":
+    from openai import OpenAI
+
+    return OpenAI(api_key=get_api_keys()["openai"])
+
+# After a failed connection, Pinecone is not retried for this many seconds, so an
+# outage does not cost a control-plane call on every rerun
+PINECONE_RETRY_SECONDS = 30
+
+# Time of the last failed Pinecone connection, shared across sessions
+@st.cache_resource(show_spinner=False)
+def get_pinecone_failure():
+    return {"failed_at": None}
+
+# Pinecone index, or None if it could not be initialized. A failure is remembered
+# for PINECONE_RETRY_SECONDS; after that the next call retries.
+def get_index():
+    failure = get_pinecone_failure()
+    if failure["failed_at"] is not None and time.monotonic() - failure["failed_at"] < PINECONE_RETRY_SECONDS:
+        return None
+    try:
+        index = get_pinecone_index()
+    except Exception as e:
+        logging.error(f"Failed to initialize Pinecone: {e}", exc_info=True)
+        failure["failed_at"] = time.monotonic()
+        return None
+    failure["failed_at"] = None
+    return index
+
+# Authorization header for backend calls. The token is per user, so it is passed on
+# each call rather than stored on the session, which is shared by every user.
+def _auth_headers(auth_token=None):
+    if auth_token is None:
+        auth_token = st.session_state.get('auth_token', '')
+    return {"Authorization": f"Bearer {auth_token}"}
+
+# Request body and headers for a JSON payload, encoded with orjson instead of the
+# stdlib json that requests uses for json=
+def json_request(payload, headers=None):
+    return {"data": orjson.dumps(payload), "headers": {**(headers or {}), "Content-Type": "application/json"}}
+
+# Idempotency key for a backend write: a hash of the action and its payload. It is
+# sent as the Idempotency-Key header, so the backend can drop a resubmitted write.
+def idempotency_key(action, payload):
+    body = orjson.dumps([action, payload], option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+# (key, result) of the last successful write for an action if it had the same key,
+# so a rerun that repeats the write reuses the result instead of sending it again
+def last_write(action, key):
+    previous = st.session_state.get("last_writes", {}).get(action)
+    if previous and previous[0] == key:
+        logging.info(f"Skipping repeated {action} request")
+        return previous
+    return None
 
-except Exception as e:
-    st.error(f"Failed to initialize Pinecone: {str(e)}")
-    logging.error(f"Exception encountered: {e}", exc_info=True)
-    st.write(f"Error type: {type(e).__name__}")
-    st.write(f"Error details: {str(e)}")
+# Only successful results are remembered; a failed write must be sent again on retry
+def remember_write(action, key, result):
+    if not result:
+        return
+    st.session_state.setdefault("last_writes", {})[action] = (key, result)
 
-# Initialize OpenAI (keep this part as is)
-try:
-    client = OpenAI(api_key=openai_api_key)
-except Exception as e:
-    st.error(f"Failed to initialize OpenAI: {str(e)}")
-    logging.error(f"OpenAI initialization error: {e}")
-    st.stop()
+# Request body and headers for a multipart upload. The encoder streams the body in
+# chunks as it is sent, instead of requests building the whole body in memory first.
+def multipart_request(fields, headers=None):
+    encoder = MultipartEncoder(fields=fields)
+    return {"data": encoder, "headers": {**(headers or {}), "Content-Type": encoder.content_type}}
+
+# Response bodies can be large, so they are only logged at DEBUG level, truncated,
+# and formatted lazily when the record is actually emitted
+RESPONSE_LOG_LIMIT = 512
+
+def log_response_content(response, message="Response content"):
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("%s: %s", message, response.content[:RESPONSE_LOG_LIMIT])
 
-# Helper function to handle API responses
+# Parse a JSON response body with orjson, raising the same error type as response.json()
+def parse_json(response):
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos)
+
+# Helper function to handle API responses. The body is parsed once and the
+# parsed value is reused for both the error message and the return value.
 def handle_api_response(response):
+    data, parse_error = None, None
     try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as http_err:
-        st.error(f"HTTP error occurred: {response.json().get('message', str(http_err))}")
-        logging.error(f"HTTP error occurred: {http_err}")
-        logging.info(f"Response content: {response.content}")
+        data = parse_json(response)
+    except ValueError as err:
+        parse_error = err
+    if not response.ok:
+        message = data.get('message') if isinstance(data, dict) else None
+        st.error(f"HTTP error occurred: {message or f'{response.status_code} {response.reason}'}")
+        logging.error(f"HTTP error occurred: {response.status_code} {response.reason} for url: {response.url}")
+        log_response_content(response)
+        return None
+    if parse_error is not None:
+        st.error(f"An error occurred: {parse_error}")
+        logging.error(f"Unexpected error: {parse_error}")
+        log_response_content(response)
         return None
-    except Exception as err:
-        st.error(f"An error occurred: {err}")
-        logging.error(f"Unexpected error: {err}")
-        logging.info(f"Response content: {response.content}")
+    log_response_content(response, "Successful API Response content")
+    return data
+
+# Maximum number of texts sent to OpenAI in a single embeddings request
+EMBEDDING_BATCH_SIZE = 100
+
+# On-disk embedding cache so embeddings survive process restarts
+EMBEDDING_CACHE_PATH = ".emb_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ROWS = 100000
+EMBEDDING_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# SQLite connection for the on-disk embedding cache, shared across reruns and
+# sessions. A connection is not safe to use from several threads at once, so
+# every use holds the store's lock.
+@st.cache_resource(show_spinner=False)
+def get_embedding_store():
+    conn = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False)
+    # WAL with NORMAL sync commits without an fsync of the main database file, so a
+    # batch write costs one append to the log. It does not make the shared
+    # connection concurrent; the lock below does that.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings "
+        "(key BLOB PRIMARY KEY, vec BLOB NOT NULL, created_at REAL NOT NULL)"
+    )
+    # Expiry and size trimming both select by age
+    conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+    conn.commit()
+    return {"conn": conn, "lock": threading.Lock()}
+
+# Version of the cached values. Bumped when what gets embedded changes, so entries
+# computed the old way are never served; they expire with the TTL.
+EMBEDDING_CACHE_VERSION = 2
+
+# Cache key for an embedding: SHA-256 of the cache version, model name, output size and the text
+def embedding_cache_key(text, model, dimensions=None):
+    model_id = model if dimensions is None else f"{model}/{dimensions}"
+    return hashlib.sha256(f"v{EMBEDDING_CACHE_VERSION}:{model_id}:{text}".encode("utf-8")).digest()
+
+# Look up embeddings on disk, returning {key: embedding} for the hits
+def load_cached_embeddings(keys):
+    found = {}
+    try:
+        store = get_embedding_store()
+        keys = list(set(keys))
+        with store["lock"]:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = store["conn"].execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders}) AND created_at >= ?",
+                    [*chunk, time.time() - EMBEDDING_CACHE_TTL_SECONDS]
+                ).fetchall()
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float32)
+    except Exception as e:
+        logging.error(f"Embedding cache read error: {e}")
+    return found
+
+# Persist {key: embedding} to disk, dropping expired rows and the oldest rows beyond the size cap
+def save_cached_embeddings(items):
+    if not items:
+        return
+    try:
+        store = get_embedding_store()
+        conn = store["conn"]
+        now = time.time()
+        with store["lock"], conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vec, created_at) VALUES (?, ?, ?)",
+                [(key, embedding.tobytes(), now) for key, embedding in items.items()]
+            )
+            conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - EMBEDDING_CACHE_TTL_SECONDS,))
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (EMBEDDING_CACHE_MAX_ROWS,)
+            )
+        embedding_disk_count.clear()
+    except Exception as e:
+        logging.error(f"Embedding cache write error: {e}")
+
+# Number of embedding batches sent to OpenAI concurrently
+EMBEDDING_CONCURRENCY = 4
+
+# L2-normalize an embedding once when it is created, so every later cosine
+# comparison is a plain dot product
+def normalize_embedding(embedding):
+    return embedding / (np.linalg.norm(embedding) + 1e-12)
+
+# Send one batch of (key, text) pairs to OpenAI and return {key: embedding}.
+# Uses the raw response with base64-encoded float32 vectors, skipping the SDK's
+# per-item model construction and float parsing. Runs on worker threads, so the
+# client is passed in rather than looked up from the Streamlit cache.
+def _request_embeddings(client, batch, model, dimensions=None):
+    started = time.perf_counter()
+    options = {"dimensions": dimensions} if dimensions else {}
+    raw_response = client.embeddings.with_raw_response.create(
+        input=[text for _, text in batch],
+        model=model,
+        encoding_format="base64",
+        **options
+    )
+    data = sorted(orjson.loads(raw_response.http_response.content)["data"], key=lambda item: item["index"])
+    elapsed = time.perf_counter() - started
+    logging.info(f"Embedded {len(batch)} texts in {elapsed:.3f}s ({elapsed * 1000 / len(batch):.1f} ms per item)")
+    return {
+        key: normalize_embedding(np.frombuffer(base64.b64decode(item["embedding"]), dtype=np.float32))
+        for (key, _), item in zip(batch, data)
+    }
+
+# In-memory LRU of embeddings with hit/miss counters, shared across reruns.
+# Entries are held as float16, halving the cache's footprint; unit-length
+# embeddings lose well under 0.1% cosine precision in the round trip.
+EMBEDDING_MEMORY_CACHE_SIZE = 4096
+EMBEDDING_STATS_LOG_INTERVAL = 100
+
+@st.cache_resource(show_spinner=False)
+def get_embedding_memory_cache():
+    return {
+        "entries": OrderedDict(),
+        "memory_hits": 0,
+        "disk_hits": 0,
+        "misses": 0,
+        "lookups": 0,
+        "in_flight": {},
+        "lock": threading.Lock()
+    }
+
+# Normalize question text so Unicode compatibility forms, whitespace, case and
+# trailing punctuation variants compare equal. The one normalizer keys the embedding
+# cache, exact-duplicate checks and remembered similarity results alike. Only keys
+# are normalized; OpenAI still embeds the original text, matching the vectors
+# stored in Pinecone.
+TRAILING_PUNCTUATION = "?!.,;: "
+
+def normalize_question(question):
+    question = unicodedata.normalize("NFKC", question)
+    return " ".join(question.split()).lower().rstrip(TRAILING_PUNCTUATION)
+
+# Embeddings for texts, served from memory, then disk, then OpenAI for the rest
+def _embed_texts(texts, model, dimensions=None):
+    keys = [embedding_cache_key(normalize_question(text), model, dimensions) for text in texts]
+    memory_cache = get_embedding_memory_cache()
+
+    embeddings = {}
+    with memory_cache["lock"]:
+        for key in keys:
+            if key in memory_cache["entries"]:
+                memory_cache["entries"].move_to_end(key)
+                embeddings[key] = memory_cache["entries"][key].astype(np.float32)
+    memory_hits = sum(key in embeddings for key in keys)
+
+    on_disk = load_cached_embeddings([key for key in keys if key not in embeddings])
+    embeddings.update(on_disk)
+    disk_hits = sum(key in on_disk for key in keys)
+
+    # Single-flight: keys another caller is already fetching are awaited rather
+    # than requested again, so concurrent identical misses cost one API call
+    missing = {key: text for key, text in zip(keys, texts) if key not in embeddings}
+    owned, waiting = {}, {}
+    with memory_cache["lock"]:
+        for key in missing:
+            if key in memory_cache["in_flight"]:
+                waiting[key] = memory_cache["in_flight"][key]
+            else:
+                owned[key] = memory_cache["in_flight"][key] = Future()
+
+    to_fetch = [(key, missing[key]) for key in owned]
+    batches = [to_fetch[start:start + EMBEDDING_BATCH_SIZE] for start in range(0, len(to_fetch), EMBEDDING_BATCH_SIZE)]
+    fetched = {}
+    try:
+        if batches:
+            client = get_openai_client()
+            with ThreadPoolExecutor(max_workers=min(EMBEDDING_CONCURRENCY, len(batches))) as executor:
+                for batch_result in executor.map(lambda batch: _request_embeddings(client, batch, model, dimensions), batches):
+                    fetched.update(batch_result)
+        save_cached_embeddings(fetched)
+        for key, future in owned.items():
+            future.set_result(fetched[key])
+    except Exception as e:
+        for future in owned.values():
+            if not future.done():
+                future.set_exception(e)
+        raise
+    finally:
+        with memory_cache["lock"]:
+            for key in owned:
+                memory_cache["in_flight"].pop(key, None)
+    embeddings.update(fetched)
+    for key, future in waiting.items():
+        embeddings[key] = future.result()
+
+    with memory_cache["lock"]:
+        for key in set(on_disk) | set(fetched):
+            memory_cache["entries"][key] = embeddings[key].astype(np.float16)
+        while len(memory_cache["entries"]) > EMBEDDING_MEMORY_CACHE_SIZE:
+            memory_cache["entries"].popitem(last=False)
+        memory_cache["memory_hits"] += memory_hits
+        memory_cache["disk_hits"] += disk_hits
+        memory_cache["misses"] += len(keys) - memory_hits - disk_hits
+        previous_lookups = memory_cache["lookups"]
+        memory_cache["lookups"] += len(keys)
+        if memory_cache["lookups"] // EMBEDDING_STATS_LOG_INTERVAL != previous_lookups // EMBEDDING_STATS_LOG_INTERVAL:
+            logging.info(
+                f"Embedding cache stats: {memory_cache['memory_hits']} memory hits, {memory_cache['disk_hits']} disk hits, "
+                f"{memory_cache['misses']} misses, {len(memory_cache['entries'])} entries in memory"
+            )
+    return tuple(embeddings[key] for key in keys)
+
+# Number of embeddings on disk. Counting scans the table, so the count is cached
+# briefly and refreshed after each write.
+@st.cache_data(ttl=60, show_spinner=False)
+def embedding_disk_count():
+    try:
+        store = get_embedding_store()
+        with store["lock"]:
+            return store["conn"].execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    except Exception as e:
+        logging.error(f"Embedding cache read error: {e}")
         return None
-    logging.info(f"Successful API Response content: {response.content}")
-    return response.json()
 
-# Caching for embedding generation to improve scalability
-@lru_cache(maxsize=1024)
-def get_embedding(text, model="text-embedding-3-small"):
+# Embedding cache counters and sizes, in the spirit of functools' cache_info()
+def embedding_cache_info():
+    memory_cache = get_embedding_memory_cache()
+    disk_size = embedding_disk_count()
+    return {
+        "memory_hits": memory_cache["memory_hits"],
+        "disk_hits": memory_cache["disk_hits"],
+        "misses": memory_cache["misses"],
+        "memory_size": len(memory_cache["entries"]),
+        "disk_size": disk_size
+    }
+
+# Show embedding cache hit rate and size in the sidebar
+def show_embedding_cache_stats():
+    info = embedding_cache_info()
+    hits = info["memory_hits"] + info["disk_hits"]
+    lookups = hits + info["misses"]
+    st.sidebar.metric("Embedding hit rate", f"{hits / lookups:.0%}" if lookups else "N/A")
+    st.sidebar.metric("Cached embeddings", f"{info['memory_size']} in memory / {info['disk_size']} on disk")
+
+# Generate embeddings for several texts with one OpenAI call per batch
+def get_embeddings_batch(texts, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS):
     try:
-        text = text.replace("\n", " ")
-        return client.embeddings.create(input=[text], model=model).data[0].embedding
+        return _embed_texts(tuple(texts), model, dimensions)
     except Exception as e:
-        st.error("Failed to generate embedding. Please try again later.")
-        logging.error(f"Embedding generation error: {e}")
+        st.error("Failed to generate embeddings. Please try again later.")
+        logging.error(f"Batch embedding generation error: {e}")
         return None
 
-# Function to check for similar questions in Pinecone
-def check_similarity(embedding, threshold=0.6):
-    if 'index' not in globals():
-        logging.warning("Pinecone index not available. Similarity check skipped.")
+# Vector values as sent to Pinecone. Embeddings are kept as float32 arrays
+# everywhere else and only become Python lists at this boundary.
+def pinecone_values(embedding):
+    return embedding.tolist()
+
+# In-process write-through cache of stored questions, searched before Pinecone.
+# Vectors live in one contiguous float32 matrix grown by doubling, so a search is
+# a single BLAS matrix-vector product over the filled rows.
+@st.cache_resource(show_spinner=False)
+def get_local_question_index():
+    return {"vectors": None, "count": 0, "questions": [], "lock": threading.Lock()}
+
+# Add (question, embedding) pairs to the local index; embeddings are already unit length
+def local_index_add(pairs):
+    if not pairs:
+        return
+    local_index = get_local_question_index()
+    vectors = np.stack([embedding for _, embedding in pairs])
+    with local_index["lock"]:
+        count = local_index["count"]
+        needed = count + len(vectors)
+        matrix = local_index["vectors"]
+        if matrix is None or matrix.shape[1] != vectors.shape[1]:
+            matrix = np.empty((max(needed, 64), vectors.shape[1]), dtype=np.float32)
+            count = 0
+            local_index["questions"] = []
+            needed = len(vectors)
+        elif needed > len(matrix):
+            grown = np.empty((max(needed, 2 * len(matrix)), matrix.shape[1]), dtype=np.float32)
+            grown[:count] = matrix[:count]
+            matrix = grown
+        matrix[count:needed] = vectors
+        local_index["vectors"] = matrix
+        local_index["count"] = needed
+        local_index["questions"].extend(question for question, _ in pairs)
+
+# Best local match for an embedding as (question, cosine score), or (None, None)
+def local_index_search(embedding, local_index=None):
+    if local_index is None:
+        local_index = get_local_question_index()
+    with local_index["lock"]:
+        count = local_index["count"]
+        if not count or local_index["vectors"].shape[1] != len(embedding):
+            return None, None
+        vectors = local_index["vectors"][:count]
+        questions = local_index["questions"]
+    scores = vectors @ embedding
+    best = int(scores.argmax())
+    return questions[best], float(scores[best])
+
+# Normalized texts of stored questions, for exact-duplicate checks without any network call
+@st.cache_resource(show_spinner=False)
+def get_known_questions():
+    return set()
+
+# True if the question exactly matches a stored, queued or already added question
+def is_exact_duplicate(question):
+    normalized = normalize_question(question)
+    if normalized in get_known_questions():
+        return True
+    if any(normalize_question(item["question"]) == normalized for item in st.session_state.get("pending_questions", [])):
+        return True
+    return any(
+        normalize_question(existing) == normalized
+        for section in st.session_state.get("new_quiz", {}).get("sections", [])
+        for subsection in section["subsections"]
+        for existing in subsection["questions"]
+    )
+
+# Deadline for a single Pinecone similarity query
+PINECONE_QUERY_TIMEOUT_SECONDS = 5
+
+# Check for a similar question, locally first and then in Pinecone, against an
+# already resolved Pinecone index (or None) and local index. Safe to run on worker
+# threads, since it does not touch Streamlit caches.
+def _query_similarity(embedding, threshold, index, local_index):
+    similar_question, score = local_index_search(embedding, local_index)
+    if similar_question is not None and score > threshold:
+        return similar_question, score
+    if index is None:
         return None, None
     try:
-        query_result = index.query(vector=embedding, top_k=1, include_metadata=True)
+        # Query scores only; the matched question's text is fetched only when it is needed
+        query_result = index.query(
+            vector=pinecone_values(embedding),
+            top_k=1,
+            include_metadata=False,
+            timeout=PINECONE_QUERY_TIMEOUT_SECONDS
+        )
         if query_result['matches']:
-            score = query_result['matches'][0]['score']
-            if score > threshold:
-                return query_result['matches'][0]['metadata']['question'], score
+            match = query_result['matches'][0]
+            if match['score'] > threshold:
+                fetch_result = index.fetch(ids=[match['id']])
+                return fetch_result['vectors'][match['id']]['metadata']['question'], match['score']
     except Exception as e:
         logging.error(f"Similarity check error: {e}")
     return None, None
-    
+
+# Number of parallel Pinecone queries issued by check_similarity_batch
+SIMILARITY_QUERY_WORKERS = 8
+
+# Worker threads for similarity queries, kept for the process so reruns reuse them
+@st.cache_resource(show_spinner=False)
+def get_similarity_executor():
+    return ThreadPoolExecutor(max_workers=SIMILARITY_QUERY_WORKERS, thread_name_prefix="similarity")
+
+# Check several embeddings at once; Pinecone has no multi-vector query, so fan out over threads
+def check_similarity_batch(embeddings, threshold=0.6):
+    if not embeddings:
+        return []
+    # Resolve the cached indexes on the script thread; worker threads have no
+    # Streamlit script context to look them up with
+    index = get_index()
+    if index is None:
+        logging.warning("Pinecone index not available. Similarity check skipped.")
+        st.warning("Similarity checking against stored questions is unavailable right now; only questions added in this session were checked.")
+    local_index = get_local_question_index()
+    executor = get_similarity_executor()
+    return list(executor.map(lambda embedding: _query_similarity(embedding, threshold, index, local_index), embeddings))
+
+# Number of vectors sent to Pinecone in a single upsert request
+PINECONE_UPSERT_BATCH_SIZE = 100
+
+# Stable Pinecone vector id for a question text
+def question_vector_id(question):
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()
+
+# Store (question, embedding) pairs in Pinecone with batched upserts
+def store_questions_bulk(pairs):
+    index = get_index()
+    if index is None:
+        logging.warning("Pinecone index not available. Questions not stored.")
+        st.warning("Pinecone is unavailable, so the new questions were not stored for similarity checks.")
+        return False
+    vectors = []
+    for question, embedding in pairs:
+        vectors.append({
+            "id": question_vector_id(question),
+            "values": pinecone_values(embedding),
+            "metadata": {"question": question}
+        })
+    try:
+        for start in range(0, len(vectors), PINECONE_UPSERT_BATCH_SIZE):
+            index.upsert(vectors=vectors[start:start + PINECONE_UPSERT_BATCH_SIZE])
+        logging.info(f"Stored {len(vectors)} questions in Pinecone")
+        st.session_state.pop("vector_count", None)
+        local_index_add(pairs)
+        get_known_questions().update(normalize_question(question) for question, _ in pairs)
+        return True
+    except Exception as e:
+        logging.error(f"Pinecone upsert error: {e}")
+        return False
+
+# Maximum number of ids Pinecone accepts in a single delete request
+PINECONE_DELETE_BATCH_SIZE = 1000
+
+# Remove questions from the local index by zeroing their rows
+def local_index_remove(questions):
+    local_index = get_local_question_index()
+    questions = set(questions)
+    with local_index["lock"]:
+        for row, question in enumerate(local_index["questions"]):
+            if question in questions:
+                local_index["vectors"][row] = 0
+
+# Delete questions from Pinecone with batched delete calls
+def delete_questions_bulk(questions):
+    if not questions:
+        return True
+    local_index_remove(questions)
+    get_known_questions().difference_update(normalize_question(question) for question in questions)
+    index = get_index()
+    if index is None:
+        logging.warning("Pinecone index not available. Questions not deleted.")
+        st.warning("Pinecone is unavailable; deleted questions will be removed from similarity checks once it is back.")
+        return False
+    ids = list({question_vector_id(question) for question in questions})
+    try:
+        for start in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+            index.delete(ids=ids[start:start + PINECONE_DELETE_BATCH_SIZE])
+        logging.info(f"Deleted {len(ids)} questions from Pinecone")
+        st.session_state.pop("vector_count", None)
+        return True
+    except Exception as e:
+        logging.error(f"Pinecone delete error: {e}")
+        return False
+
+# Number of vectors in the Pinecone index, from index stats rather than a dummy query.
+# Cached for the session and refreshed after this session stores or deletes questions.
+def get_vector_count():
+    if "vector_count" not in st.session_state:
+        index = get_index()
+        if index is None:
+            return None
+        try:
+            st.session_state["vector_count"] = index.describe_index_stats()["total_vector_count"]
+        except Exception as e:
+            logging.error(f"Pinecone stats error: {e}")
+            return None
+    return st.session_state["vector_count"]
+
+# Send the deletions queued on the Quiz Management page to Pinecone in one go
+def flush_pending_deletes():
+    pending = st.session_state.get("pending_deletes", [])
+    if pending and delete_questions_bulk(pending):
+        st.session_state["pending_deletes"] = []
+
 # Create Quiz
 def create_quiz(quiz_data):
+    key = idempotency_key("create_quiz", quiz_data)
+    previous = last_write("create_quiz", key)
+    if previous:
+        return previous[1]
     try:
-        response = requests.post(
-            f"{api_base_url}/quiz/create",
-            json=quiz_data,
-            headers={"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
+        response = SESSION.post(
+            QUIZ_CREATE_URL,
+            **json_request(quiz_data, {**_auth_headers(), "Idempotency-Key": key}),
+            timeout=HTTP_TIMEOUT
         )
         logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
+        log_response_content(response)
         result = handle_api_response(response)
         if result and result.get("success"):
+            invalidate_quiz_cache()
             st.success("Quiz created successfully!")
+            remember_write("create_quiz", key, result.get("quiz"))
             return result.get("quiz")
         else:
             st.error(f"Failed to create quiz: {result.get('message', 'Unknown error')}")
@@ -146,63 +776,137 @@ def create_quiz(quiz_data):
         logging.error(f"Error in create_quiz: {e}")
     return None
 
+# Fetch the quiz list, cached briefly since it is requested on every rerun
+QUIZ_LIST_CACHE_TTL_SECONDS = 30
+
+@st.cache_data(ttl=QUIZ_LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_all_quizzes(page: int, size: int, auth_token: str):
+    response = SESSION.get(
+        QUIZ_LIST_URL,
+        params={"page": page, "size": size},
+        headers=_auth_headers(auth_token),
+        timeout=HTTP_TIMEOUT
+    )
+    logging.info(f"Response status code: {response.status_code}")
+    log_response_content(response)
+    # Raise on errors so that failed requests are not cached
+    response.raise_for_status()
+    return parse_json(response).get("quizzes", {}).get("items", [])
+
+# Drop cached quiz reads after a create, update or delete
+def invalidate_quiz_cache():
+    _fetch_all_quizzes.clear()
+    _fetch_quiz_details_cached.clear()
+    _fetch_quiz_details_many.clear()
+
 # Fetch All Quizzes
 def get_all_quizzes(page: int = 1, size: int = 50):
-    url = f"{api_base_url}/quiz/list"
-    params = {"page": page, "size": size}
-    headers = {"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
     try:
-        response = requests.get(url, params=params, headers=headers)
-        logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("quizzes", {}).get("items", [])
-        elif response.status_code == 404:
+        return _fetch_all_quizzes(page, size, st.session_state.get('auth_token', ''))
+    except requests.exceptions.HTTPError as http_err:
+        status_code = http_err.response.status_code
+        if status_code == 404:
             logging.error("Quizzes not found")
-        elif response.status_code == 401:
+        elif status_code == 401:
             logging.error("Not authenticated")
         else:
-            logging.error(f"Unexpected error: {response.status_code}")
+            logging.error(f"Unexpected error: {status_code}")
     except Exception as e:
         logging.error(f"Error in get_all_quizzes: {e}")
         st.error(f"An error occurred: {e}")
     return []
 
-# Fetch quiz details by ID
-def get_quiz_details(quiz_id: str):
-    url = f"{api_base_url}/quiz/{quiz_id}"
-    headers = {
-        "Authorization": f"Bearer {st.session_state.get('auth_token', '')}",
-        "Accept": "application/json"
-    }
+# Number of concurrent requests when fetching details for a page of quizzes
+QUIZ_DETAILS_WORKERS = 16
+
+# Fetch quiz details without touching Streamlit state, so it can run on worker threads
+def _fetch_quiz_details(quiz_id: str, auth_token: str):
+    response = SESSION.get(
+        QUIZ_DETAIL_URL.format(quiz_id=quiz_id),
+        headers={**_auth_headers(auth_token), "Accept": "application/json"},
+        timeout=HTTP_TIMEOUT
+    )
+    logging.info(f"Response status code for quiz {quiz_id}: {response.status_code}")
+    if response.status_code == 200:
+        return parse_json(response).get("quiz", {})
+    # Raised rather than returned, so the cached callers do not keep the failure
+    raise requests.HTTPError(f"Failed to fetch quiz details for {quiz_id}: {response.status_code}", response=response)
+
+# Fetch quiz details by ID, cached briefly like the quiz list. Failures raise, so they are not cached.
+@st.cache_data(ttl=QUIZ_LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_quiz_details_cached(quiz_id: str, auth_token: str) -> Dict[str, Any]:
+    return _fetch_quiz_details(quiz_id, auth_token)
+
+def get_quiz_details(quiz_id: str) -> Dict[str, Any]:
     try:
-        response = requests.get(url, headers=headers)
-        logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
-        if response.status_code == 200:
-            return response.json().get("quiz", {})
-        else:
-            st.error(f"Failed to fetch quiz details: {response.status_code}")
-            return {}
+        return _fetch_quiz_details_cached(quiz_id, st.session_state.get('auth_token', ''))
     except Exception as e:
         logging.error(f"Error in get_quiz_details: {e}")
         st.error(f"An error occurred: {e}")
         return {}
 
+# Raised by _fetch_quiz_details_many when some quizzes failed to load. Raising keeps
+# st.cache_data from caching the partial result; the details that did load are
+# carried on the exception for the caller to show.
+class QuizDetailsError(Exception):
+    def __init__(self, details: Dict[str, Dict[str, Any]], failed: List[str]):
+        super().__init__(f"Failed to fetch details for quizzes: {', '.join(failed)}")
+        self.details = details
+        self.failed = failed
+
+# Quiz details, or None if the request failed, so one failing quiz does not fail a batch
+def _try_fetch_quiz_details(quiz_id: str, auth_token: str):
+    try:
+        return _fetch_quiz_details(quiz_id, auth_token)
+    except Exception as e:
+        logging.error(f"Error fetching quiz details for {quiz_id}: {e}")
+        return None
+
+# Fetch details for several quizzes concurrently over the pooled session.
+# Only a fully successful batch is cached.
+@st.cache_data(ttl=QUIZ_LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_quiz_details_many(quiz_ids: tuple, auth_token: str) -> Dict[str, Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=min(QUIZ_DETAILS_WORKERS, len(quiz_ids))) as executor:
+        results = list(executor.map(lambda quiz_id: _try_fetch_quiz_details(quiz_id, auth_token), quiz_ids))
+    details = {quiz_id: result for quiz_id, result in zip(quiz_ids, results) if result is not None}
+    if len(details) < len(quiz_ids):
+        raise QuizDetailsError(details, [quiz_id for quiz_id in quiz_ids if quiz_id not in details])
+    return details
+
+def get_quiz_details_many(quiz_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if not quiz_ids:
+        return {}
+    try:
+        return _fetch_quiz_details_many(tuple(quiz_ids), st.session_state.get('auth_token', ''))
+    except QuizDetailsError as e:
+        logging.error(f"Error in get_quiz_details_many: {e}")
+        st.error(f"Could not load details for {len(e.failed)} of {len(quiz_ids)} quizzes. Reload the page to try again.")
+        return e.details
+    except Exception as e:
+        logging.error(f"Error in get_quiz_details_many: {e}")
+        st.error(f"An error occurred while fetching quiz details: {e}")
+        return {}
+
 # Update Quiz
 def update_quiz(quiz_id: str, quiz_data: dict):
+    key = idempotency_key("update_quiz", [quiz_id, quiz_data])
+    previous = last_write("update_quiz", key)
+    if previous:
+        return previous[1]
     try:
-        response = requests.put(
-            f"{api_base_url}/quiz/{quiz_id}",
-            json=quiz_data,
-            headers={"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
+        response = SESSION.put(
+            QUIZ_DETAIL_URL.format(quiz_id=quiz_id),
+            **json_request(quiz_data, {**_auth_headers(), "Idempotency-Key": key}),
+            timeout=HTTP_TIMEOUT
         )
         logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
+        log_response_content(response)
         if response.status_code == 200:
+            invalidate_quiz_cache()
             st.success("Quiz updated successfully!")
-            return response.json()
+            result = parse_json(response)
+            remember_write("update_quiz", key, result)
+            return result
         else:
             st.error(f"Failed to update quiz: {response.status_code}")
             return None
@@ -213,16 +917,23 @@ def update_quiz(quiz_id: str, quiz_data: dict):
 
 # Delete Quiz
 def delete_quiz(quiz_id: str):
+    key = idempotency_key("delete_quiz", quiz_id)
+    previous = last_write("delete_quiz", key)
+    if previous:
+        return previous[1]
     try:
-        response = requests.delete(
-            f"{api_base_url}/quiz/{quiz_id}",
-            headers={"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
+        response = SESSION.delete(
+            QUIZ_DETAIL_URL.format(quiz_id=quiz_id),
+            headers={**_auth_headers(), "Idempotency-Key": key},
+            timeout=HTTP_TIMEOUT
         )
         logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
+        log_response_content(response)
         result = handle_api_response(response)
         if result and result.get("success"):
+            invalidate_quiz_cache()
             st.success(f"Quiz {quiz_id} deleted successfully!")
+            remember_write("delete_quiz", key, True)
             return True
         else:
             st.error(f"Failed to delete quiz {quiz_id}: {result.get('message', 'Unknown error')}")
@@ -234,18 +945,17 @@ def delete_quiz(quiz_id: str):
 # Upload Puzzle
 def upload_puzzle(file, quiz_id: str):
     try:
-        files = {"file": file}
-        data = {"quiz_id": quiz_id}
-        response = requests.post(
-            f"{api_base_url}/admin/quiz/puzzle/upload",
-            files=files,
-            data=data,
-            headers={"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
+        fields = {"quiz_id": quiz_id, "file": (file.name, file, file.type)}
+        response = SESSION.post(
+            PUZZLE_UPLOAD_URL,
+            **multipart_request(fields, _auth_headers()),
+            timeout=HTTP_UPLOAD_TIMEOUT
         )
         logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
+        log_response_content(response)
         result = handle_api_response(response)
         if result and result.get("success"):
+            invalidate_quiz_cache()
             st.success("Puzzle uploaded successfully!")
             return result.get("puzzle")
         else:
@@ -256,29 +966,38 @@ def upload_puzzle(file, quiz_id: str):
     return None
 
 # List Estheticians
+# Fetch the esthetician approval list, cached briefly like the quiz list
+@st.cache_data(ttl=QUIZ_LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_estheticians(page: int, limit: int, auth_token: str) -> List[Dict[str, Any]]:
+    response = SESSION.get(
+        ESTHETICIAN_APPROVAL_LIST_URL,
+        params={"page": page, "limit": limit},
+        headers=_auth_headers(auth_token),
+        timeout=HTTP_TIMEOUT
+    )
+    logging.info(f"Response status code: {response.status_code}")
+    log_response_content(response)
+    # Raise on errors so that failed requests are not cached
+    response.raise_for_status()
+    result = parse_json(response)
+    if not result.get("success"):
+        raise ValueError(result.get("message", "Unknown error"))
+    return result.get("estheticians", [])
+
 def list_estheticians(page: int = 1, limit: int = 10) -> List[Dict[str, Any]]:
     try:
-        response = requests.get(
-            f"{api_base_url}/admin/esthetician/approval_list",
-            params={"page": page, "limit": limit},
-            headers={"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
-        )
-        print(f"{api_base_url}/admin/esthetician/approval_list")
-        logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
-        result = handle_api_response(response)
-        if result and result.get("success"):
-            return result.get("estheticians", [])
-        else:
-            st.error("Failed to fetch estheticians. Please try again later.")
-            return []
+        return _fetch_estheticians(page, limit, st.session_state.get('auth_token', ''))
+    except requests.exceptions.HTTPError as http_err:
+        st.error("Failed to fetch estheticians. Please try again later.")
+        logging.error(f"HTTP error in list_estheticians: {http_err}")
+        return []
     except Exception as e:
         st.error("An error occurred while fetching estheticians.")
         logging.error(f"Error in list_estheticians: {e}")
         return []
 
 # Approve Esthetician
-def approve_esthetician(esthetician_id: str, is_approved: bool = True, reason_for_rejection: str = "N/A") -> str:
+def approve_esthetician(esthetician_id: str, is_approved: bool = True, reason_for_rejection: str = "N/A") -> bool:
     try:
         st.write(f"Reason for rejection: {reason_for_rejection}")
         is_approved_str = "true" if is_approved else "false"
@@ -287,25 +1006,31 @@ def approve_esthetician(esthetician_id: str, is_approved: bool = True, reason_fo
             "reason_for_rejection": reason_for_rejection if not is_approved else "N/A"
         }
         logging.info(f"Request body for approving esthetician: {request_body}")
-        response = requests.put(
-            f"{api_base_url}/admin/approve_esthetician/{esthetician_id}",
-            json=request_body,
-            headers={"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
+        key = idempotency_key("approve_esthetician", [esthetician_id, request_body])
+        previous = last_write("approve_esthetician", key)
+        if previous:
+            return previous[1]
+        response = SESSION.put(
+            APPROVE_ESTHETICIAN_URL.format(esthetician_id=esthetician_id),
+            **json_request(request_body, {**_auth_headers(), "Idempotency-Key": key}),
+            timeout=HTTP_TIMEOUT
         )
         logging.info(f"Response status code: {response.status_code}")
-        logging.info(f"Response content: {response.content}")
+        log_response_content(response)
         result = handle_api_response(response)
         if result and result.get("success"):
+            _fetch_estheticians.clear()
             status = "approved" if is_approved else "rejected"
             st.success(f"Esthetician {esthetician_id} {status} successfully.")
-            return "true"
+            remember_write("approve_esthetician", key, True)
+            return True
         else:
             st.error(f"Failed to update esthetician {esthetician_id}.")
-            return "false"
+            return False
     except Exception as e:
         st.error(f"An error occurred while updating esthetician {esthetician_id}.")
         logging.error(f"Error in approve_esthetician: {e}")
-        return "false"
+        return False
 
 # Show Admin Page
 def show_admin_page():
@@ -324,41 +1049,49 @@ def show_admin_page():
         st.success("You have been logged out.")
 
 def analyze_skin_condition(text_input: str, image_file=None):
-    url = f"{api_base_url}/ai/analyze_skin"
+    url = ANALYZE_SKIN_URL
     
-    if image_file is not None:
-        files = {
-            'image': image_file
-        }
-        data = {
-            'text_input': text_input
-        }
-        response = requests.post(url, files=files, data=data)
-    else:
-        payload = {
-            "text_input": text_input
-        }
-        response = requests.post(url, json=payload)
+    try:
+        if image_file is not None:
+            fields = {
+                'text_input': text_input,
+                'image': (image_file.name, image_file, image_file.type)
+            }
+            response = SESSION.post(url, **multipart_request(fields), timeout=HTTP_UPLOAD_TIMEOUT)
+        else:
+            payload = {
+                "text_input": text_input
+            }
+            response = SESSION.post(url, **json_request(payload), timeout=HTTP_AI_TIMEOUT)
+    except requests.RequestException as e:
+        st.error("Skin analysis is not responding. Please try again later.")
+        logging.error(f"Error in analyze_skin_condition: {e}")
+        return None
 
-    print(response.text)
+    log_response_content(response)
     if response.status_code == 200:
-        return response.json()
+        return parse_json(response)
     else:
         return None
 
 def get_quiz_recommendations(skin_type: str, condition: str):
-    url = f"{api_base_url}/ai/diary_quiz_recommendation"
+    url = QUIZ_RECOMMENDATION_URL
     payload = {
         "skin_type": skin_type,
         "condition": condition
     }
-    headers = {"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
+    headers = _auth_headers()
 
-    response = requests.post(url, json=payload, headers=headers)
+    try:
+        response = SESSION.post(url, **json_request(payload, headers), timeout=HTTP_AI_TIMEOUT)
+    except requests.RequestException as e:
+        st.error("Quiz recommendations are not responding. Please try again later.")
+        logging.error(f"Error in get_quiz_recommendations: {e}")
+        return None
 
-    print(response.text)
+    log_response_content(response)
     if response.status_code == 200:
-        return response.json().get('quiz_list', [])
+        return parse_json(response).get('quiz_list', [])
     else:
         print(f"Failed to fetch quiz recommendations: {response.status_code} - {response.text}")
         return None
@@ -366,14 +1099,14 @@ def get_quiz_recommendations(skin_type: str, condition: str):
 def start_quiz(quiz_id: str):
     print("Starting Quiz")
     try:
-        url = f"{api_base_url}/quiz/start_quiz"
+        url = START_QUIZ_URL
         params = {"quiz_id": quiz_id}  
-        headers = {"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
-        response = requests.get(url, headers=headers, params=params)
+        headers = _auth_headers()
+        response = SESSION.get(url, headers=headers, params=params, timeout=HTTP_AI_TIMEOUT)
 
         if response.status_code == 200:
-            quiz_details = response.json().get('question_details', {})
-            logging.info(f"Quiz started successfully: {quiz_details}")
+            quiz_details = parse_json(response).get('question_details', {})
+            logging.debug("Quiz started successfully: %s", quiz_details)
             return quiz_details
         else:
             st.error(f"Failed to start quiz: {response.status_code} - {response.text}")
@@ -383,30 +1116,40 @@ def start_quiz(quiz_id: str):
         print(str(e))
 
 def fetch_next_question(quiz_id: str, question_id: str, response: str, response_time: int):
-    url = f"{api_base_url}/quiz/fetch_next"
+    url = FETCH_NEXT_QUESTION_URL
     payload = {
         "quiz_id": quiz_id,
         "question_id": question_id,
         "response": response,
         "response_time": response_time
     }
-    headers = {"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
-    response = requests.post(url, json=payload, headers=headers)
+    headers = _auth_headers()
+    try:
+        response = SESSION.post(url, **json_request(payload, headers), timeout=HTTP_AI_TIMEOUT)
+    except requests.RequestException as e:
+        st.error("Failed to fetch next question. Please try again.")
+        logging.error(f"Error in fetch_next_question: {e}")
+        return None
 
     if response.status_code == 200:
-        return response.json().get('question_details', {})
+        return parse_json(response).get('question_details', {})
     else:
         st.error(f"Failed to fetch next question: {response.status_code} - {response.text}")
         return None
 
 def submit_quiz(quiz_id: str):
-    url = f"{api_base_url}/quiz/submit"
+    url = SUBMIT_QUIZ_URL
     payload = {"quiz_id": quiz_id}
-    headers = {"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
-    response = requests.post(url, json=payload, headers=headers)
+    headers = _auth_headers()
+    try:
+        response = SESSION.post(url, **json_request(payload, headers), timeout=HTTP_AI_TIMEOUT)
+    except requests.RequestException as e:
+        st.error("Failed to submit the quiz. Please try again.")
+        logging.error(f"Error in submit_quiz: {e}")
+        return None
 
     if response.status_code == 200:
-        return response.json()
+        return parse_json(response)
     else:
         st.error(f"Failed to submit quiz: {response.status_code} - {response.text}")
         return None
@@ -424,17 +1167,6 @@ def show_recommendations_page():
     if st.button("Back to Main"):
         st.session_state["page"] = "main"
 
-def get_quiz_details(quiz_id: str):
-    url = f"{api_base_url}/quiz/{quiz_id}"
-    headers = {"Authorization": f"Bearer {st.session_state.get('auth_token', '')}"}
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200 and response.json().get('success'):
-        return response.json().get('quiz', {})
-    else:
-        st.error(f"Failed to fetch quiz details: {response.status_code} - {response.text}")
-        return None
-    
 def show_quiz_details_page(quiz_id: str):
     st.title("Quiz Details")
 
@@ -593,6 +1325,36 @@ def show_insights_page():
         st.session_state["page"] = "login"
 
 # Show Quiz Management
+# Button callbacks for Quiz Management. Callbacks run before the script reruns, so
+# each click costs one rerun that already reflects the change.
+def request_question_delete(quiz_id, question_idx):
+    st.session_state['delete_confirm'] = {
+        "quiz_id": quiz_id,
+        "question_idx": question_idx
+    }
+
+def cancel_question_delete():
+    st.session_state.pop('delete_confirm', None)
+
+# Drop the edit widgets' state for a quiz so they show the saved values again
+def reset_quiz_edits(title):
+    prefix = f"{title}_question_"
+    for key in [key for key in st.session_state if isinstance(key, str) and key.startswith(prefix)]:
+        del st.session_state[key]
+
+def confirm_question_delete(quiz_id, title, section, questions, question_idx):
+    st.session_state.pop('delete_confirm', None)
+    updated_quiz = {
+        "title": title,
+        "section": section,
+        "questions": questions[:question_idx] + questions[question_idx + 1:]
+    }
+    # update_quiz clears the quiz caches, so the rerun fetches the updated quiz
+    if update_quiz(quiz_id, updated_quiz):
+        # Only remove the vector once the backend has dropped the question
+        st.session_state.setdefault("pending_deletes", []).append(questions[question_idx].get('question', ''))
+        reset_quiz_edits(title)
+
 def show_quiz_management():
     st.title("Quiz Management")
     page = st.number_input("Page", min_value=1, value=1)
@@ -601,11 +1363,16 @@ def show_quiz_management():
     quizzes = get_all_quizzes(page, size)
 
     if quizzes:
-        for quiz_idx, quiz in enumerate(quizzes):
+        all_quiz_details = get_quiz_details_many([quiz.get("_id") for quiz in quizzes if quiz.get("_id")])
+        for quiz in quizzes:
             quiz_id = quiz.get("_id")
             st.write(f"ID: {quiz_id}")
             if quiz_id:
-                quiz_details = get_quiz_details(quiz_id)
+                quiz_details = all_quiz_details.get(quiz_id)
+                # Without the saved details, Save would overwrite the quiz with placeholders
+                if not quiz_details:
+                    st.error(f"Could not load details for quiz {quiz_id}. Reload the page to try again.")
+                    continue
                 title = quiz_details.get("title", "N/A")
                 section = quiz_details.get("section", "N/A")
                 questions = quiz_details.get("questions", [])
@@ -613,78 +1380,316 @@ def show_quiz_management():
                 st.markdown(f"### {title}")
                 st.markdown(f"**Section**: {section}")
 
-                edited_questions = []
-                for q_idx, question in enumerate(questions):
-                    question_text = st.text_area(f"Question: {question.get('question', 'N/A')}", value=question.get('question', 'N/A'), key=f"{title}_question_{q_idx}")
-                    options = question.get("options", [])
-                    edited_options = [st.text_area(f"Option {i+1}", value=option, key=f"{title}_question_{q_idx}_option_{i}") for i, option in enumerate(options)]
-
-                    # Delete question button
-                    if st.button(f"Delete Question {q_idx + 1}", key=f"delete_{title}_{q_idx}"):
-                        st.session_state['delete_confirm'] = {
-                            "quiz_id": quiz_id,
-                            "question_idx": q_idx
-                        }
-
-                    # Check if a delete confirmation is required
-                    if 'delete_confirm' in st.session_state and st.session_state['delete_confirm']['quiz_id'] == quiz_id and st.session_state['delete_confirm']['question_idx'] == q_idx:
-                        st.warning(f"Are you sure you want to delete this question: '{question_text}'?")
-                        if st.button("Confirm Delete", key=f"confirm_delete_{title}_{q_idx}"):
-                            st.session_state.pop('delete_confirm')
-                            # Remove the question from the list
-                            questions.pop(q_idx)
-                            updated_quiz = {
-                                "title": title,
-                                "section": section,
-                                "questions": questions
-                            }
-                            update_quiz(quiz_id, updated_quiz)
-                            st.query_params.update(rerun=True)
-
-                        if st.button("Cancel", key=f"cancel_delete_{title}_{q_idx}"):
-                            st.session_state.pop('delete_confirm')
-
-                    # Add the question to the list only if it wasn't deleted
-                    if not (st.session_state.get('delete_confirm', {}).get('question_idx') == q_idx):
-                        edited_questions.append({
-                            "question_id": question.get("question_id"),
-                            "question": question_text,
-                            "options": edited_options
-                        })
-
-                if st.button("Save", key=f"save_{title}_{quiz_idx}"):
+                delete_confirm = st.session_state.get('delete_confirm')
+                pending_delete_idx = delete_confirm['question_idx'] if delete_confirm and delete_confirm['quiz_id'] == quiz_id else None
+
+                # Edits are collected in a form, so typing does not rerun the page until Save
+                with st.form(key=f"edit_{quiz_id}"):
+                    edited_questions = []
+                    for q_idx, question in enumerate(questions):
+                        question_text = st.text_area(f"Question: {question.get('question', 'N/A')}", value=question.get('question', 'N/A'), key=f"{title}_question_{q_idx}")
+                        options = question.get("options", [])
+                        edited_options = [st.text_area(f"Option {i+1}", value=option, key=f"{title}_question_{q_idx}_option_{i}") for i, option in enumerate(options)]
+
+                        # Add the question to the list only if it isn't awaiting deletion
+                        if q_idx != pending_delete_idx:
+                            edited_questions.append({
+                                "question_id": question.get("question_id"),
+                                "question": question_text,
+                                "options": edited_options
+                            })
+
+                    save = st.form_submit_button("Save")
+                    st.form_submit_button("Discard", on_click=reset_quiz_edits, args=(title,))
+
+                if save:
                     updated_quiz = {
                         "title": title,
                         "section": section,
                         "questions": edited_questions
                     }
                     update_quiz(quiz_id, updated_quiz)
-
-                if st.button("Discard", key=f"discard_{title}_{quiz_idx}"):
-                    st.query_params.update(rerun=True)
+                    flush_pending_deletes()
+
+                # Delete question controls; buttons cannot live inside the form
+                if questions:
+                    delete_idx = st.selectbox(
+                        "Question to delete",
+                        range(len(questions)),
+                        format_func=lambda q_idx: f"{q_idx + 1}. {questions[q_idx].get('question', 'N/A')}",
+                        key=f"delete_select_{quiz_id}"
+                    )
+                    st.button("Delete Question", key=f"delete_{quiz_id}", on_click=request_question_delete, args=(quiz_id, delete_idx))
+
+                # Check if a delete confirmation is required
+                if pending_delete_idx is not None and pending_delete_idx < len(questions):
+                    st.warning(f"Are you sure you want to delete this question: '{questions[pending_delete_idx].get('question', 'N/A')}'?")
+                    st.button(
+                        "Confirm Delete",
+                        key=f"confirm_delete_{quiz_id}",
+                        on_click=confirm_question_delete,
+                        args=(quiz_id, title, section, questions, pending_delete_idx)
+                    )
+                    st.button("Cancel", key=f"cancel_delete_{quiz_id}", on_click=cancel_question_delete)
 
     if st.button("Back to Admin Page", key="back_to_admin"):
+        flush_pending_deletes()
         st.session_state["page"] = "admin"
 
 
+# Find a section or subsection dict by its stable uid
+def find_by_uid(items, uid):
+    return next((item for item in items if item.get("uid") == uid), None)
+
+# Quiz payload for the API, without the uids used only for widget keys
+def new_quiz_payload(new_quiz):
+    return {
+        "quiz_title": new_quiz["quiz_title"],
+        "sections": [
+            {
+                "section_name": section["section_name"],
+                "subsections": [
+                    {"subsection_name": subsection["subsection_name"], "questions": subsection["questions"]}
+                    for subsection in section["subsections"]
+                ]
+            }
+            for section in new_quiz["sections"]
+        ]
+    }
+
+# Flatten the new quiz into one row per question for the grid editor
+def questions_to_frame(new_quiz):
+    rows = [
+        {
+            "section_uid": section.get("uid"),
+            "subsection_uid": subsection.get("uid"),
+            "section": section["section_name"],
+            "subsection": subsection["subsection_name"],
+            "question": question
+        }
+        for section in new_quiz["sections"]
+        for subsection in section["subsections"]
+        for question in subsection["questions"]
+    ]
+    return pd.DataFrame(rows, columns=["section_uid", "subsection_uid", "section", "subsection", "question"])
+
+# (section, subsection) identified by uid, or by name for rows added or moved in the
+# grid; subsection is None if there is no match
+def find_subsection(section_uid, subsection_uid, section_name, subsection_name):
+    sections = st.session_state["new_quiz"]["sections"]
+    section = find_by_uid(sections, section_uid) or next((s for s in sections if s["section_name"] == section_name), None)
+    subsection = None
+    if section:
+        subsection = find_by_uid(section["subsections"], subsection_uid) or next(
+            (s for s in section["subsections"] if s["subsection_name"] == subsection_name), None
+        )
+    return section, subsection
+
+# Queue a question for the subsection identified by uid, or by name for rows added in the grid
+def queue_question(section_uid, subsection_uid, section_name, subsection_name, question):
+    section, subsection = find_subsection(section_uid, subsection_uid, section_name, subsection_name)
+    if subsection is None:
+        st.error(f"No subsection '{subsection_name}' in section '{section_name}' for question '{question}'.")
+        return
+    st.session_state["pending_questions"].append({
+        "section_uid": section["uid"],
+        "subsection_uid": subsection["uid"],
+        "question": question
+    })
+
+# Apply grid edits in one pass: deleted rows are dropped, edited, moved and new rows are
+# validated like form input and queued so they go through the batched embedding
+# and similarity check
+def apply_question_grid(original, edited):
+    kept = {}
+    removed = set()
+    to_queue = []
+    for row_id, row in original.iterrows():
+        if row_id not in edited.index:
+            removed.add(row["question"])
+            continue
+        new_row = edited.loc[row_id]
+        new_text = new_row["question"]
+        moved = (new_row["section"], new_row["subsection"]) != (row["section"], row["subsection"])
+        if moved and find_subsection(None, None, new_row["section"], new_row["subsection"])[1] is None:
+            st.error(f"No subsection '{new_row['subsection']}' in section '{new_row['section']}'; '{row['question']}' was not moved.")
+            moved = False
+        if new_text == row["question"] and not moved:
+            kept.setdefault(row["subsection_uid"], []).append(row["question"])
+            continue
+        removed.add(row["question"])
+        if not (isinstance(new_text, str) and new_text.strip()):
+            continue
+        if moved:
+            # Resolved by name, like rows added in the grid
+            to_queue.append((None, None, new_row["section"], new_row["subsection"], new_text))
+        else:
+            to_queue.append((row["section_uid"], row["subsection_uid"], row["section"], row["subsection"], new_text))
+
+    for row_id, row in edited.iterrows():
+        if row_id not in original.index and isinstance(row["question"], str) and row["question"].strip():
+            to_queue.append((None, None, row["section"], row["subsection"], row["question"]))
+
+    for section in st.session_state["new_quiz"]["sections"]:
+        for subsection in section["subsections"]:
+            subsection["questions"] = kept.get(subsection.get("uid"), [])
+    st.session_state["pending_upserts"] = [
+        (question, embedding) for question, embedding in st.session_state["pending_upserts"] if question not in removed
+    ]
+
+    # Checked after the edited rows' old text is gone, so a row is not a duplicate of itself
+    for section_uid, subsection_uid, section_name, subsection_name, question in to_queue:
+        rejection = question_rejection(question)
+        if rejection:
+            st.warning(rejection)
+            continue
+        queue_question(section_uid, subsection_uid, section_name, subsection_name, question)
+
+# Shorter questions are added without being embedded or similarity checked; with
+# so little text, similarity scores are not meaningful
+MIN_QUESTION_WORDS = 3
+
+def is_short_question(question_text):
+    return len(question_text.split()) < MIN_QUESTION_WORDS
+
+# Reason a question cannot be queued, or None if it can. Checked before queueing so
+# duplicates and known near-duplicates never reach the embedding call.
+def question_rejection(question_text):
+    if is_exact_duplicate(question_text):
+        return f"'{question_text}' is an exact duplicate of an existing question."
+    known_similar = st.session_state.get("similar_questions", {}).get(normalize_question(question_text))
+    if known_similar:
+        similar_question, score = known_similar
+        return f"'{question_text}' is similar to an existing question: '{similar_question}' with a similarity score of {(score*100):.2f}. Consider revising it."
+    return None
+
+# Subsection a queued question belongs to, or None if it has been removed
+def pending_subsection(sections, item):
+    section = find_by_uid(sections, item["section_uid"])
+    return find_by_uid(section["subsections"], item["subsection_uid"]) if section else None
+
+# Embed all queued questions in one batch and add the ones that pass the similarity check.
+# Returns False if the queue could not be processed and still holds questions.
+def add_pending_questions():
+    pending = st.session_state.get("pending_questions", [])
+    if not pending:
+        return True
+
+    sections = st.session_state["new_quiz"]["sections"]
+
+    # Short questions skip the embedding call and the similarity check
+    for item in pending:
+        subsection = pending_subsection(sections, item)
+        if subsection is not None and is_short_question(item["question"]):
+            subsection["questions"].append(item["question"])
+            st.success(f"Question added to {subsection['subsection_name']}.")
+    pending = [item for item in pending if not is_short_question(item["question"])]
+    st.session_state["pending_questions"] = pending
+    if not pending:
+        return True
+
+    embeddings = get_embeddings_batch(tuple(item["question"] for item in pending))
+    if embeddings is None:
+        return False
+
+    similarities = check_similarity_batch(embeddings)
+    for item, embedding, (similar_question, score) in zip(pending, embeddings, similarities):
+        subsection = pending_subsection(sections, item)
+        if subsection is None:
+            continue
+        if similar_question:
+            # Remember the result so queueing the same text again is rejected without a lookup
+            st.session_state.setdefault("similar_questions", {})[normalize_question(item["question"])] = (similar_question, score)
+            st.warning(f"'{item['question']}' is similar to an existing question: '{similar_question}' with a similarity score of {(score*100):.2f}. Consider revising it.")
+        else:
+            subsection["questions"].append(item["question"])
+            st.session_state["pending_upserts"].append((item["question"], embedding))
+            st.success(f"Question added to {subsection['subsection_name']}.")
+
+    st.session_state["pending_questions"] = []
+    return True
+
+# Render one section of the new quiz. As a fragment, typing in or queueing a
+# question reruns only this section instead of the whole page.
+@st.fragment
+def render_section(section_idx):
+    section = st.session_state["new_quiz"]["sections"][section_idx]
+    section_uid = section.setdefault("uid", uuid.uuid4().hex)
+    st.subheader(f"Section {section_idx + 1}: {section['section_name']}")
+    for subsection_idx, subsection in enumerate(section["subsections"]):
+        subsection_uid = subsection.setdefault("uid", uuid.uuid4().hex)
+        st.text(f"Subsection {subsection_idx + 1}: {subsection['subsection_name']}")
+
+        # Typing into a form does not rerun the script; only the submit does
+        with st.form(key=f"question_form_{subsection_uid}", clear_on_submit=True):
+            question_text = st.text_input(f"Enter a question for {subsection['subsection_name']}:", key=f"question_{subsection_uid}")
+            submitted = st.form_submit_button(f"Queue Question for {subsection['subsection_name']}")
+        if submitted:
+            rejection = question_rejection(question_text) if question_text else None
+            if not question_text:
+                st.error("Please enter a question.")
+            elif rejection:
+                st.warning(rejection)
+            else:
+                st.session_state["pending_questions"].append({
+                    "section_uid": section_uid,
+                    "subsection_uid": subsection_uid,
+                    "question": question_text
+                })
+                st.info(f"Question queued for {subsection['subsection_name']} ({len(st.session_state['pending_questions'])} pending).")
+
+        # Several questions at once, one per line; they are embedded together by "Add Queued Questions"
+        with st.expander(f"Add multiple questions to {subsection['subsection_name']}"):
+            with st.form(key=f"bulk_question_form_{subsection_uid}", clear_on_submit=True):
+                bulk_text = st.text_area("One question per line", key=f"bulk_questions_{subsection_uid}")
+                bulk_submitted = st.form_submit_button("Queue Questions")
+        if bulk_submitted:
+            queued = 0
+            for line in bulk_text.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                rejection = question_rejection(line)
+                if rejection:
+                    st.warning(rejection)
+                    continue
+                st.session_state["pending_questions"].append({
+                    "section_uid": section_uid,
+                    "subsection_uid": subsection_uid,
+                    "question": line
+                })
+                queued += 1
+            st.info(f"{queued} questions queued for {subsection['subsection_name']} ({len(st.session_state['pending_questions'])} pending).")
+
 # Create Quiz Page
 def create_quiz_page():
     st.title("Create a New Quiz")
     st.write("You can add sections, subsections, and questions. Each question will be checked for similarity before being added.")
+    vector_count = get_vector_count()
+    if vector_count is not None:
+        st.caption(f"{vector_count} questions stored for similarity checks.")
 
     if "new_quiz" not in st.session_state:
         st.session_state["new_quiz"] = {
             "quiz_title": "",
             "sections": []
         }
+    if "pending_questions" not in st.session_state:
+        st.session_state["pending_questions"] = []
+    if "pending_upserts" not in st.session_state:
+        st.session_state["pending_upserts"] = []
 
     st.session_state["new_quiz"]["quiz_title"] = st.text_input("Enter Quiz Title", value=st.session_state["new_quiz"]["quiz_title"], help="The title of the quiz.")
-    new_section_name = st.text_input("Enter Section Name", help="Add a new section to your quiz.")
-    new_subsection_name = st.text_input("Enter Subsection Name", help="Add a new subsection under the section.")
+    with st.form(key="structure_form", clear_on_submit=True):
+        new_section_name = st.text_input("Enter Section Name", help="Add a new section to your quiz.")
+        new_subsection_name = st.text_input("Enter Subsection Name", help="Add a new subsection under the section.")
+        add_section = st.form_submit_button("Add Section")
+        add_subsection = st.form_submit_button("Add Subsection")
 
-    if st.button("Add Section"):
+    if add_section:
         if new_section_name:
             st.session_state["new_quiz"]["sections"].append({
+                "uid": uuid.uuid4().hex,
                 "section_name": new_section_name,
                 "subsections": []
             })
@@ -692,9 +1697,10 @@ def create_quiz_page():
         else:
             st.error("Please enter a section name.")
 
-    if st.button("Add Subsection"):
+    if add_subsection:
         if new_subsection_name and st.session_state["new_quiz"]["sections"]:
             st.session_state["new_quiz"]["sections"][-1]["subsections"].append({
+                "uid": uuid.uuid4().hex,
                 "subsection_name": new_subsection_name,
                 "questions": []
             })
@@ -702,34 +1708,51 @@ def create_quiz_page():
         else:
             st.error("Please enter a subsection name or add a section first.")
 
-    for section_idx, section in enumerate(st.session_state["new_quiz"]["sections"]):
-        st.subheader(f"Section {section_idx + 1}: {section['section_name']}")
-        for subsection_idx, subsection in enumerate(section["subsections"]):
-            st.text(f"Subsection {subsection_idx + 1}: {subsection['subsection_name']}")
-
-            question_text = st.text_input(f"Enter a question for {subsection['subsection_name']}:", key=f"question_{section_idx}_{subsection_idx}")
-            if st.button(f"Add Question to {subsection['subsection_name']}", key=f"add_question_{section_idx}_{subsection_idx}"):
-                if question_text:
-                    embedding = get_embedding(question_text)
-                    similar_question, score = check_similarity(embedding)
-                    if similar_question:
-                        st.warning(f"This question is similar to an existing question: '{similar_question}' with a similarity score of {(score*100):.2f}. Consider revising it.")
-                    else:
-                        subsection["questions"].append(question_text)
-                        st.success(f"Question added to {subsection['subsection_name']}.")
-                else:
-                    st.error("Please enter a question.")
+    for section_idx in range(len(st.session_state["new_quiz"]["sections"])):
+        render_section(section_idx)
+
+    # Handled before the grid is drawn, so newly added questions show up in this run
+    if st.button("Add Queued Questions"):
+        add_pending_questions()
+
+    # All added questions in one editable grid instead of per-question widgets
+    questions_frame = questions_to_frame(st.session_state["new_quiz"])
+    if not questions_frame.empty:
+        st.subheader("Questions")
+        grid_version = st.session_state.setdefault("question_grid_version", 0)
+        edited_frame = st.data_editor(
+            questions_frame,
+            num_rows="dynamic",
+            column_order=("section", "subsection", "question"),
+            key=f"question_grid_{grid_version}"
+        )
+        if st.button("Apply Grid Changes"):
+            apply_question_grid(questions_frame, edited_frame)
+            st.session_state["question_grid_version"] = grid_version + 1
+            st.rerun()
 
     if st.button("Save Quiz"):
-        if create_quiz(st.session_state["new_quiz"]):
+        if not add_pending_questions():
+            st.error("Queued questions could not be checked, so the quiz was not saved. Please try again.")
+        elif create_quiz(new_quiz_payload(st.session_state["new_quiz"])):
             st.success("Quiz saved successfully!")
+            store_questions_bulk(st.session_state.pop("pending_upserts", []))
             st.session_state.pop("new_quiz")
+            st.session_state.pop("pending_questions", None)
         else:
             st.error("Failed to save the quiz. Please try again later.")
 
     if st.button("Back"):
         st.session_state["page"] = "quiz_management"
 
+# Name of the single subsection questions are edited under
+DEFAULT_SUBSECTION = "Default Subsection"
+
+# Leave the quiz editor for Quiz Management
+def exit_quiz_edit():
+    st.session_state.pop("editing_quiz", None)
+    st.session_state["page"] = "quiz_management"
+
 # Edit Quiz Page
 def edit_quiz_page():
     if "editing_quiz" not in st.session_state:
@@ -740,62 +1763,94 @@ def edit_quiz_page():
     quiz = st.session_state["editing_quiz"]
     st.title(f"Edit Quiz: {quiz['title']}")
 
-    # Edit quiz title
-    new_title = st.text_input("Quiz Title", value=quiz['title'])
-
     # Check if 'section' key exists in the quiz data and is a string
     if 'section' not in quiz or not isinstance(quiz['section'], str):
         st.error("Quiz data is missing section or section is not a string.")
         return
 
-    # Extract sections from the Pinecone data
-    sections = [{"name": quiz['section'], "subsections": [{"name": "Default Subsection", "questions": quiz.get('questions', [])}]}]
-
-    # Edit sections and subsections
-    updated_sections = []
-    for section in sections:
-        st.subheader(f"Section: {section['name']}")
-        new_section_name = st.text_input("Section Name", value=section['name'], key=f"section_{section['name']}")
-
+    # Edits are collected in a form, so typing does not rerun the script until Save Changes
+    with st.form("edit_quiz"):
+        # Edit quiz title
+        new_title = st.text_input("Quiz Title", value=quiz['title'])
+
+        # Quizzes have a single section with one default subsection
+        st.subheader(f"Section: {quiz['section']}")
+        new_section_name = st.text_input("Section Name", value=quiz['section'], key="section_name")
+        st.text(f"Subsection: {DEFAULT_SUBSECTION}")
+        new_subsection_name = st.text_input("Subsection Name", value=DEFAULT_SUBSECTION, key="subsection_name")
+
+        questions = quiz.get('questions', [])
+        new_question_texts = [
+            st.text_area("Question", value=question, key=f"q_{idx}")
+            for idx, question in enumerate(questions)
+        ]
+
+        submitted = st.form_submit_button("Save Changes")
+
+    if submitted:
+        # Only changed questions, and only changed names, are sent. One list
+        # comparison skips the per-question scan when only the names changed.
+        updated_questions = []
+        if new_question_texts != questions:
+            updated_questions = [
+                {"id": idx, "text": text}
+                for idx, (question, text) in enumerate(zip(questions, new_question_texts))
+                if text != question
+            ]
         updated_subsections = []
-        for subsection in section['subsections']:
-            st.text(f"Subsection: {subsection['name']}")
-            new_subsection_name = st.text_input("Subsection Name", value=subsection['name'], key=f"subsection_{subsection['name']}")
-
-            updated_questions = []
-            for idx, question in enumerate(subsection['questions']):
-                new_question_text = st.text_area("Question", value=question, key=f"question_{idx}")
-                if new_question_text != question:
-                    updated_questions.append({"id": idx, "text": new_question_text})
-
-            if new_subsection_name != subsection['name'] or updated_questions:
-                updated_subsections.append({
-                    "name": new_subsection_name,
-                    "questions": updated_questions
-                })
-
-        if new_section_name != section['name'] or updated_subsections:
-            updated_sections.append({
-                "name": new_section_name,
-                "subsections": updated_subsections
-            })
+        if new_subsection_name != DEFAULT_SUBSECTION or updated_questions:
+            updated_subsections.append({"name": new_subsection_name, "questions": updated_questions})
+        updated_sections = []
+        if new_section_name != quiz['section'] or updated_subsections:
+            updated_sections.append({"name": new_section_name, "subsections": updated_subsections})
 
-    if st.button("Save Changes"):
         updated_quiz = {
             "id": quiz['_id'],
             "title": new_title,
             "section": updated_sections
         }
         if update_quiz(quiz['_id'], updated_quiz):
-            st.success("Quiz updated successfully!")
-            st.session_state.pop("editing_quiz")
-            st.session_state["page"] = "quiz_management"
+            exit_quiz_edit()
+            st.rerun()
         else:
             st.error("Failed to update quiz. Please try again.")
 
-    if st.button("Cancel"):
-        st.session_state.pop("editing_quiz")
-        st.session_state["page"] = "quiz_management"
+    st.button("Cancel", on_click=exit_quiz_edit)
+
+# License file contents as bytes. The data arrives either base64-encoded or as a
+# serialized Buffer ({"type": "Buffer", "data": [byte values]}). Decoded bytes are
+# cached per esthetician; the data argument is not hashed, since that would cost
+# as much as decoding it.
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def decode_license_file(esthetician_id, _data):
+    if isinstance(_data, dict):
+        _data = _data.get("data", b"")
+    if isinstance(_data, list):
+        return bytes(_data)
+    return base64.b64decode(_data)
+
+# Show a license file inline if it is an image, or offer it as a download otherwise
+def show_license_file(esthetician_id, license_file):
+    try:
+        content = decode_license_file(esthetician_id, license_file['data'])
+    except Exception as e:
+        st.error("Could not read the license file.")
+        logging.error(f"Error decoding license file for {esthetician_id}: {e}")
+        return
+    content_type = license_file.get('contentType') or "application/octet-stream"
+    if content_type.startswith("image/"):
+        st.image(content)
+    else:
+        st.download_button(
+            "Download license file",
+            data=content,
+            file_name=f"license_{esthetician_id}",
+            mime=content_type,
+            key=f"license_download_{esthetician_id}",
+        )
+
+# Esthetician fields shown in the management table
+ESTHETICIAN_COLUMNS = ["_id", "full_name", "license_no", "email", "esthetician_status", "reason_for_rejection"]
 
 # Show Esthetician Management
 def show_esthetician_management():
@@ -807,24 +1862,32 @@ def show_esthetician_management():
     estheticians = list_estheticians(page, limit)
 
     if estheticians:
+        # Read-only fields go in one table; only pending estheticians get widgets
+        st.dataframe(
+            pd.DataFrame(
+                [{column: esthetician.get(column) for column in ESTHETICIAN_COLUMNS} for esthetician in estheticians],
+                columns=ESTHETICIAN_COLUMNS,
+            ),
+            hide_index=True,
+            use_container_width=True,
+        )
         for esthetician in estheticians:
-            st.write(f"ID: {esthetician['_id']}")
-            st.write(f"Name: {esthetician['full_name']}, License No: {esthetician['license_no']}")
-            st.write(f"Email: {esthetician['email']}, Status: {esthetician['esthetician_status']}")
-            st.write(f"License File: {esthetician['license_file']['data']}")
-            if "reason_for_rejection" in esthetician and esthetician["reason_for_rejection"] != "N/A":
-                st.write(f"Reason for Rejection: {esthetician['reason_for_rejection']}")
-            if esthetician['esthetician_status'] != 'approved':
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button(f"Approve {esthetician['full_name']}", key=f"approve_{esthetician['_id']}"):
-                        if approve_esthetician(esthetician['_id'], is_approved=True) == "true":
-                            st.query_params.update(rerun=True)
-                with col2:
-                    reason_for_rejection = st.text_input(f"Reason for rejecting {esthetician['full_name']}", key=f"reason_{esthetician['_id']}")
-                    if st.button(f"Reject {esthetician['full_name']}", key=f"reject_{esthetician['_id']}"):
-                        if approve_esthetician(esthetician['_id'], is_approved=False, reason_for_rejection=reason_for_rejection) == "true":
-                            st.query_params.update(rerun=True)
+            if esthetician['esthetician_status'] == 'approved':
+                continue
+            st.subheader(esthetician['full_name'])
+            # The file is only decoded and sent to the browser once the reviewer asks for it
+            if st.toggle("Show license file", key=f"license_{esthetician['_id']}"):
+                show_license_file(esthetician['_id'], esthetician['license_file'])
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"Approve {esthetician['full_name']}", key=f"approve_{esthetician['_id']}"):
+                    if approve_esthetician(esthetician['_id'], is_approved=True):
+                        st.rerun()
+            with col2:
+                reason_for_rejection = st.text_input(f"Reason for rejecting {esthetician['full_name']}", key=f"reason_{esthetician['_id']}")
+                if st.button(f"Reject {esthetician['full_name']}", key=f"reject_{esthetician['_id']}"):
+                    if approve_esthetician(esthetician['_id'], is_approved=False, reason_for_rejection=reason_for_rejection):
+                        st.rerun()
             st.markdown("---")  # Add a horizontal line
     else:
         st.write("No estheticians found or failed to fetch the list.")
@@ -836,14 +1899,15 @@ def show_esthetician_management():
 def show_login_page():
     st.title("Esthelogy Admin")
 
-    username = st.text_input("Email")
-    password = st.text_input("Password", type="password")
-    api_url = f"{api_base_url}/user/login"
+    # Credentials are entered in a form, so typing does not rerun the script
+    with st.form("login_form"):
+        username = st.text_input("Email")
+        password = st.text_input("Password", type="password")
+        submitted = st.form_submit_button("Login")
 
-    if st.button("Login"):
+    if submitted:
         logging.info(f"Attempting to login with email: {username}")
-        auth_response = authenticate(username, password, api_url)
-        logging.info(f"Authentication response: {auth_response}")
+        auth_response = authenticate(username, password, LOGIN_URL)
         if auth_response:
             if auth_response.get("success"):
                 st.success("Login successful!")
@@ -864,78 +1928,67 @@ def show_login_page():
 def authenticate(username, password, api_url):
     payload = {"email": username, "password": password}
     try:
-        st.write(f"Sending authentication request to: {api_url}")
-        response = requests.post(api_url, json=payload)
-        st.write(f"Authentication response status code: {response.status_code}")
+        logging.debug("Sending authentication request to: %s", api_url)
+        response = SESSION.post(api_url, **json_request(payload), timeout=HTTP_TIMEOUT)
+        logging.debug("Authentication response status code: %s", response.status_code)
         response.raise_for_status()
-        return response.json()
+        return parse_json(response)
     except requests.exceptions.RequestException as e:
         st.error(f"Authentication error: {str(e)}")
         return None
 
+# Sidebar navigation buttons as (label, widget key, page)
+NAVIGATION = (
+    ("Admin Page", "nav_admin_page", "admin"),
+    ("Esthetician Management", "nav_esthetician_management", "esthetician_management"),
+    ("Quiz Management", "nav_quiz_management", "quiz_management"),
+    ("Create Quiz", "nav_create_quiz", "create_quiz"),
+    ("Chatroom", "nav_chatroom", "chatroom"),
+)
+
 # Define Navigation Menu
 def show_navigation_menu():
     st.sidebar.title("Navigation")
-    if st.sidebar.button("Admin Page", key="nav_admin_page"):
-        st.session_state["page"] = "admin"
-    if st.sidebar.button("Esthetician Management", key="nav_esthetician_management"):
-        st.session_state["page"] = "esthetician_management"
-    if st.sidebar.button("Quiz Management", key="nav_quiz_management"):
-        st.session_state["page"] = "quiz_management"
-    if st.sidebar.button("Create Quiz", key="nav_create_quiz"):
-        st.session_state["page"] = "create_quiz"
-    if st.sidebar.button("Chatroom", key="nav_chatroom"):
-        st.session_state["page"] = "chatroom"
+    for label, key, page in NAVIGATION:
+        if st.sidebar.button(label, key=key):
+            st.session_state["page"] = page
     if st.sidebar.button("Logout", key="nav_logout"):
+        flush_pending_deletes()
         st.session_state.clear()
         st.session_state["page"] = "login"
         st.success("You have been logged out.")
+    if APP_DEBUG:
+        show_embedding_cache_stats()
+
+# Page renderers by page name
+PAGES = {
+    "login": show_login_page,
+    "admin": show_admin_page,
+    "quiz_management": show_quiz_management,
+    "create_quiz": create_quiz_page,
+    "edit_quiz": edit_quiz_page,
+    "esthetician_management": show_esthetician_management,
+    "chatroom": show_chatroom_page,
+    "quiz": show_quiz_page,
+    "view_quiz": lambda: show_quiz_details_page(st.session_state["quiz_id"]),
+    "insights": show_insights_page,
+}
 
 # Main function to control the app flow
 def main():
-    #for debugging
-    # Sample log entry
-    log_entry = "2024-08-25 04:11:52,951 INFO Total quizzes: 0"
-
-    # Define the regular expression pattern
-    pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) (\w+) (.+)'
-
-    # Use re.findall to extract information
-    matches = re.findall(pattern, log_entry)
-
-    # Process the extracted information
-    for match in matches:
-        timestamp, log_level, message = match
-        print(f"Timestamp: {timestamp}")
-        print(f"Log Level: {log_level}")
-        print(f"Message: {message}")
-
-    # Original code
-    if "page" not in st.session_state:
-        st.session_state["page"] = "login"
+    st.session_state.setdefault("page", "login")
 
     show_navigation_menu()  # Display the navigation menu
 
-    if st.session_state["page"] == "login":
-        show_login_page()
-    elif st.session_state["page"] == "admin":
-        show_admin_page()
-    elif st.session_state["page"] == "quiz_management":
-        show_quiz_management()
-    elif st.session_state["page"] == "create_quiz":
-        create_quiz_page()
-    elif st.session_state["page"] == "edit_quiz":
-        edit_quiz_page()
-    elif st.session_state["page"] == "esthetician_management":
-        show_esthetician_management()
-    elif st.session_state["page"] == "chatroom":
-        show_chatroom_page()
-    elif st.session_state["page"] == "quiz":
-        show_quiz_page()
-    elif st.session_state["page"] == "view_quiz":
-        show_quiz_details_page(st.session_state["quiz_id"])
-    elif st.session_state["page"] == "insights":
-        show_insights_page()
+    # Deletions queued on Quiz Management are sent once the user has left it,
+    # however they left
+    if st.session_state["page"] != "quiz_management":
+        flush_pending_deletes()
+
+    # The menu may have switched pages, so look the page up again
+    render_page = PAGES.get(st.session_state["page"])
+    if render_page:
+        render_page()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)